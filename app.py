@@ -1,47 +1,70 @@
-from fastapi import FastAPI, Depends, Request, HTTPException
-from fastapi.responses import RedirectResponse, JSONResponse
-from sqlalchemy.orm import Session
-from database import get_db, create_tables
+from fastapi import FastAPI, Depends, Request, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio import Redis
+from database import engine, get_db, get_cache, create_tables, create_redis, warm_pool
 from models import CreateShortURLRequest, CreateShortURLResponse, URLStatistics, ErrorResponse
-from services import URLShortenerService
+from services import URLShortenerService, start_click_flusher, stop_click_flusher
 from middleware import LoggingMiddleware
+from responses import ORJSONResponse, FastRedirect
+from utils import format_iso8601, open_geoip_reader, close_geoip_reader
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from email.utils import formatdate
+from typing import Optional
+import asyncio
+import time
 import uvicorn
 from config import config
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect everything before uvicorn starts accepting traffic
+    await create_tables()
+    await warm_pool()
+    app.state.redis = create_redis()
+    open_geoip_reader(config.GEOIP_DB_PATH)
+    
+    # Clicks are queued by the redirect handler and written in batches
+    app.state.click_queue = asyncio.Queue(maxsize=config.CLICK_QUEUE_SIZE)
+    flusher = start_click_flusher(app.state.click_queue)
+    yield
+    await stop_click_flusher(app.state.click_queue, flusher)
+    close_geoip_reader()
+    await app.state.redis.aclose()
+    await engine.dispose()
+
 # Create FastAPI app
 app = FastAPI(
     title="URL Shortener Microservice",
     description="A robust HTTP URL Shortener Microservice with analytics",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add custom logging middleware
 app.add_middleware(LoggingMiddleware)
 
-# Create database tables
-create_tables()
-
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
-        content=ErrorResponse(
+        content=ErrorResponse.model_construct(
             error=f"HTTP {exc.status_code}",
             message=exc.detail,
-            timestamp=datetime.now(timezone.utc).isoformat()
-        ).dict()
+            timestamp=format_iso8601(datetime.now(timezone.utc))
+        ).model_dump()
     )
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
-        content=ErrorResponse(
+        content=ErrorResponse.model_construct(
             error="Internal Server Error",
             message="An unexpected error occurred",
-            timestamp=datetime.now(timezone.utc).isoformat()
-        ).dict()
+            timestamp=format_iso8601(datetime.now(timezone.utc))
+        ).model_dump()
     )
 
 @app.get("/")
@@ -51,26 +74,32 @@ async def root():
 @app.post("/shorturls", response_model=CreateShortURLResponse, status_code=201)
 async def create_short_url(
     request: CreateShortURLRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache)
 ):
     """Create a new shortened URL"""
-    service = URLShortenerService(db)
-    return service.create_short_url(request)
+    service = URLShortenerService(db, cache)
+    return await service.create_short_url(request)
 
-@app.get("/shorturls/{shortcode}")
+@app.get("/shorturls/{shortcode}", response_model=URLStatistics)
 async def get_url_statistics(
     shortcode: str,
-    db: Session = Depends(get_db)
-) -> URLStatistics:
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache)
+):
     """Retrieve statistics for a shortened URL"""
-    service = URLShortenerService(db)
-    return service.get_statistics(shortcode)
+    service = URLShortenerService(db, cache)
+    # Returned as a response so FastAPI doesn't re-validate every click row
+    return ORJSONResponse(await service.get_statistics(shortcode, limit, offset))
 
 @app.get("/{shortcode}")
 async def redirect_to_original_url(
     shortcode: str,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    cache: Redis = Depends(get_cache)
 ):
     """Redirect to the original URL"""
     
@@ -81,15 +110,24 @@ async def redirect_to_original_url(
         'ip_address': request.client.host if request.client else None
     }
     
-    service = URLShortenerService(db)
-    original_url = service.get_original_url(shortcode, request_info)
+    service = URLShortenerService(db, cache, request.app.state.click_queue)
+    original_url, expiry_epoch = await service.get_original_url(shortcode, request_info)
     
-    return RedirectResponse(url=original_url, status_code=302)
+    # Let browsers and CDNs serve repeat hits until the link expires
+    now = int(time.time())
+    max_age = max(0, min(expiry_epoch - now, config.REDIRECT_MAX_AGE))
+    headers = {
+        "Cache-Control": f"public, max-age={max_age}",
+        "Expires": formatdate(now + max_age, usegmt=True)
+    }
+    return FastRedirect(original_url, status_code=301, headers=headers)
 
 if __name__ == "__main__":
     uvicorn.run(
         "app:app",
         host=config.HOST,
         port=config.PORT,
-        reload=True
+        loop="uvloop",
+        http="httptools",
+        workers=config.WORKERS
     )
@@ -4,18 +4,38 @@ from datetime import timedelta
 class Config:
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./url_shortener.db")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # seconds
+    
+    # Cache
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+    REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", 0.2))  # seconds, connect and per command
+    NEGATIVE_CACHE_SECONDS = 30
+    
+    # Click logging
+    GEOIP_DB_PATH = os.getenv("GEOIP_DB_PATH", "GeoLite2-City.mmdb")
+    CLICK_QUEUE_SIZE = int(os.getenv("CLICK_QUEUE_SIZE", 10000))
+    CLICK_FLUSH_BATCH = 128
+    CLICK_FLUSH_INTERVAL = 0.2  # seconds
+    CLICK_SHUTDOWN_TIMEOUT = 10  # seconds
     
     # Server
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = int(os.getenv("PORT", 8000))
+    WORKERS = int(os.getenv("WORKERS", 1))
     
     # URL Settings
     BASE_URL = os.getenv("BASE_URL", "http://hostname:port")
+    BASE_URL_PREFIX = BASE_URL.rstrip("/") + "/"
     DEFAULT_VALIDITY_MINUTES = 30
+    REDIRECT_MAX_AGE = int(os.getenv("REDIRECT_MAX_AGE", 3600))  # seconds
     
     # Shortcode Settings
     SHORTCODE_LENGTH = 6
-    SHORTCODE_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    SHORTCODE_CANDIDATES = 8  # Candidates checked per database round-trip
 
 config = Config()
 
@@ -1,41 +1,124 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from sqlalchemy import event, Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime, timezone
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from fastapi import Request
+from redis.asyncio import Redis
 import sqlite3
 from config import config
+from utils import utcnow
 
-engine = create_engine(config.DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ASYNC_DRIVERS = {
+    "sqlite://": "sqlite+aiosqlite://",
+    "postgresql://": "postgresql+asyncpg://",
+}
+
+def async_database_url(url: str) -> str:
+    """Map a plain database URL onto its asyncio driver"""
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+is_sqlite = config.DATABASE_URL.startswith("sqlite")
+
+engine = create_async_engine(
+    async_database_url(config.DATABASE_URL),
+    poolclass=AsyncAdaptedQueuePool,
+    pool_pre_ping=True,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_timeout=config.DB_POOL_TIMEOUT
+)
+
+if is_sqlite:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers proceed while the click flusher writes
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+def create_redis() -> Redis:
+    return Redis.from_url(
+        config.REDIS_URL,
+        max_connections=config.REDIS_MAX_CONNECTIONS,
+        # Fail fast so an unreachable Redis falls through to the database
+        socket_connect_timeout=config.REDIS_TIMEOUT,
+        socket_timeout=config.REDIS_TIMEOUT,
+        decode_responses=True
+    )
+
 class URLMapping(Base):
     __tablename__ = "url_mappings"
     
     id = Column(Integer, primary_key=True, index=True)
     shortcode = Column(String(50), unique=True, index=True, nullable=False)
     original_url = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utcnow)
     expires_at = Column(DateTime, nullable=False)
     click_count = Column(Integer, default=0)
+    
+    __table_args__ = (
+        # Postgres only: serves the redirect lookup as an index-only scan.
+        # Elsewhere the unique shortcode index already covers the lookup.
+        Index(
+            "ix_url_mappings_sc_covering",
+            "shortcode",
+            postgresql_include=["original_url", "expires_at", "click_count"]
+        ).ddl_if(dialect="postgresql"),
+    )
 
 class ClickLog(Base):
     __tablename__ = "click_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    shortcode = Column(String(50), index=True, nullable=False)
-    clicked_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    shortcode = Column(String(50), nullable=False)
+    clicked_at = Column(DateTime, default=utcnow)
     referrer = Column(String(500))
     user_agent = Column(String(500))
     ip_address = Column(String(45))
     location = Column(String(100))  # Coarse-grained geographical location
+    
+    __table_args__ = (
+        # Statistics filter on shortcode and order by clicked_at
+        Index("ix_click_logs_sc_time", "shortcode", "clicked_at"),
+    )
+
+# Indexes from older schemas now covered by a composite index
+SUPERSEDED_INDEXES = [
+    "ix_click_logs_shortcode",  # covered by ix_click_logs_sc_time
+]
 
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+def _create_schema(connection):
+    Base.metadata.create_all(bind=connection)
+    # create_all skips existing tables, so add indexes introduced since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+    # ...and drop the ones they replaced
+    for name in SUPERSEDED_INDEXES:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def create_tables():
+    async with engine.begin() as connection:
+        await connection.run_sync(_create_schema)
+
+async def warm_pool():
+    """Open DB_POOL_SIZE connections up front so first requests don't pay for connect"""
+    connections = [await engine.connect() for _ in range(config.DB_POOL_SIZE)]
+    for connection in connections:
+        await connection.close()
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
+
+def get_cache(request: Request) -> Redis:
+    return request.app.state.redis
\ No newline at end of file
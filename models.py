@@ -1,32 +1,38 @@
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, field_validator
 from datetime import datetime, timezone
 from typing import Optional, List
 import validators
+import re
+
+# Compiled once at import instead of per validation
+SHORTCODE_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,50}')
 
 class CreateShortURLRequest(BaseModel):
     url: str
     validity: Optional[int] = None
     shortcode: Optional[str] = None
     
-    @validator('url')
+    @field_validator('url')
+    @classmethod
     def validate_url(cls, v):
         if not validators.url(v):
             raise ValueError('Invalid URL format')
         return v
     
-    @validator('validity')
+    @field_validator('validity')
+    @classmethod
     def validate_validity(cls, v):
         if v is not None and v <= 0:
             raise ValueError('Validity must be a positive integer')
         return v
     
-    @validator('shortcode')
+    @field_validator('shortcode')
+    @classmethod
     def validate_shortcode(cls, v):
-        if v is not None:
+        if v is not None and not SHORTCODE_PATTERN.fullmatch(v):
             if len(v) < 1 or len(v) > 50:
                 raise ValueError('Shortcode must be between 1 and 50 characters')
-            if not v.replace('-', '').replace('_', '').isalnum():
-                raise ValueError('Shortcode must be alphanumeric (with optional hyphens and underscores)')
+            raise ValueError('Shortcode must be alphanumeric (with optional hyphens and underscores)')
         return v
 
 class CreateShortURLResponse(BaseModel):
@@ -0,0 +1,26 @@
+from starlette.responses import JSONResponse, Response
+from typing import Any, Mapping, Optional
+from urllib.parse import quote
+import orjson
+
+class ORJSONResponse(JSONResponse):
+    """JSON response encoded with orjson; datetimes are emitted as UTC with a Z suffix"""
+    
+    def render(self, content: Any) -> bytes:
+        # SQLite hands back naive datetimes, which are stored as UTC
+        return orjson.dumps(
+            content,
+            option=orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+        )
+
+class FastRedirect(Response):
+    """Bodyless redirect: just Location and Content-Length: 0, no HTML or content type"""
+    
+    def __init__(self, url: str, status_code: int = 302, headers: Optional[Mapping[str, str]] = None):
+        super().__init__(status_code=status_code, headers=headers)
+        try:
+            location = url.encode("ascii")
+        except UnicodeEncodeError:
+            # Stored URLs are normally ASCII; only quote the ones that aren't
+            location = quote(url, safe=":/%#?=@[]!$&'()*+,;").encode("ascii")
+        self.raw_headers.append((b"location", location))
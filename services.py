@@ -1,26 +1,50 @@
-from sqlalchemy.orm import Session
-from database import URLMapping, ClickLog
-from models import CreateShortURLRequest, CreateShortURLResponse, URLStatistics, ClickData
-from utils import generate_shortcode, calculate_expiry, is_expired, format_iso8601, extract_location_from_ip
+from sqlalchemy import select, insert, update, literal, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from database import URLMapping, ClickLog, SessionLocal
+from models import CreateShortURLRequest, CreateShortURLResponse
+from utils import generate_shortcode, calculate_expiry, format_iso8601, extract_location_from_ip, to_epoch, utcnow
 from config import config
 from fastapi import HTTPException
-from datetime import datetime, timezone
+from datetime import datetime
+from collections import Counter
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cached values for shortcodes known not to exist / to have expired
+NOT_FOUND_SENTINEL = "-"
+EXPIRED_SENTINEL = "!"
+
+# Queued by the app on shutdown; clicks queued before it are still written
+STOP_FLUSHER = None
+
+# Clicks dropped because the queue was full; reported by the flusher
+dropped_clicks = 0
+
+def cache_key(shortcode: str) -> str:
+    return f"su:{shortcode}"
 
 class URLShortenerService:
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, cache: Redis, click_queue: asyncio.Queue = None):
         self.db = db
+        self.cache = cache
+        self.click_queue = click_queue
     
-    def create_short_url(self, request: CreateShortURLRequest) -> CreateShortURLResponse:
+    async def create_short_url(self, request: CreateShortURLRequest) -> CreateShortURLResponse:
         """Create a new shortened URL"""
         
         # Handle custom shortcode
         if request.shortcode:
-            if self.shortcode_exists(request.shortcode):
+            if await self.shortcode_exists(request.shortcode):
                 raise HTTPException(status_code=409, detail="Shortcode already exists")
             shortcode = request.shortcode
         else:
-            shortcode = self.generate_unique_shortcode()
+            shortcode = await self.generate_unique_shortcode()
         
         # Calculate expiry
         validity = request.validity or config.DEFAULT_VALIDITY_MINUTES
@@ -34,11 +58,13 @@ class URLShortenerService:
         )
         
         self.db.add(url_mapping)
-        self.db.commit()
-        self.db.refresh(url_mapping)
+        await self.db.commit()
+        
+        # Warm the redirect cache (also overwrites any negative entry)
+        await self.cache_url(shortcode, request.url, expires_at)
         
         # Create response
-        short_link = f"{config.BASE_URL}/{shortcode}"
+        short_link = config.BASE_URL_PREFIX + shortcode
         expiry = format_iso8601(expires_at)
         
         return CreateShortURLResponse(
@@ -46,94 +72,226 @@ class URLShortenerService:
             expiry=expiry
         )
     
-    def get_original_url(self, shortcode: str, request_info: dict) -> str:
-        """Get original URL and log the click"""
+    async def get_original_url(self, shortcode: str, request_info: dict) -> tuple:
+        """Get original URL and its expiry (Unix seconds), and log the click"""
+        
+        cached = await self.cache_get(shortcode)
+        if cached == NOT_FOUND_SENTINEL:
+            raise HTTPException(status_code=404, detail="Shortcode not found")
+        if cached == EXPIRED_SENTINEL:
+            raise HTTPException(status_code=410, detail="Short link has expired")
         
-        url_mapping = self.db.query(URLMapping).filter(
-            URLMapping.shortcode == shortcode
-        ).first()
+        if cached is not None:
+            original_url, expiry_epoch = cached.rsplit("|", 1)
+            if time.time() > int(expiry_epoch):
+                raise HTTPException(status_code=410, detail="Short link has expired")
+            self.enqueue_click(shortcode, request_info)
+            return original_url, int(expiry_epoch)
+        
+        # Expiry is checked in SQL; live links resolve in one statement
+        url_mapping = (await self.db.execute(
+            select(URLMapping.original_url, URLMapping.expires_at)
+            .where(
+                URLMapping.shortcode == shortcode,
+                URLMapping.expires_at > utcnow()
+            )
+        )).first()
         
         if not url_mapping:
+            # Only the error path pays for telling 404 and 410 apart
+            if await self.shortcode_exists(shortcode):
+                await self.cache_set(shortcode, EXPIRED_SENTINEL, config.NEGATIVE_CACHE_SECONDS, nx=True)
+                raise HTTPException(status_code=410, detail="Short link has expired")
+            # nx: never clobber an entry written by a concurrent create_short_url
+            await self.cache_set(shortcode, NOT_FOUND_SENTINEL, config.NEGATIVE_CACHE_SECONDS, nx=True)
             raise HTTPException(status_code=404, detail="Shortcode not found")
         
-        if is_expired(url_mapping.expires_at):
-            raise HTTPException(status_code=410, detail="Short link has expired")
+        await self.cache_url(shortcode, url_mapping.original_url, url_mapping.expires_at)
         
-        # Log the click
-        self.log_click(shortcode, request_info)
+        # Click log and counter are written by click_flusher
+        self.enqueue_click(shortcode, request_info)
         
-        # Increment click count
-        url_mapping.click_count += 1
-        self.db.commit()
-        
-        return url_mapping.original_url
+        return url_mapping.original_url, to_epoch(url_mapping.expires_at)
+    
+    def enqueue_click(self, shortcode: str, request_info: dict):
+        """Queue a click event for the background flusher"""
+        global dropped_clicks
+        try:
+            self.click_queue.put_nowait({
+                'shortcode': shortcode,
+                'clicked_at': utcnow(),
+                'referrer': request_info.get('referrer'),
+                'user_agent': request_info.get('user_agent'),
+                'ip_address': request_info.get('ip_address')
+            })
+        except asyncio.QueueFull:
+            # Don't fail (or log on) the redirect if the flusher falls behind
+            dropped_clicks += 1
+    
+    async def cache_url(self, shortcode: str, original_url: str, expires_at: datetime):
+        """Cache a shortcode for the rest of its validity"""
+        expiry_epoch = to_epoch(expires_at)
+        remaining = expiry_epoch - int(time.time())
+        if remaining > 0:
+            await self.cache_set(shortcode, f"{original_url}|{expiry_epoch}", remaining)
     
-    def get_statistics(self, shortcode: str) -> URLStatistics:
-        """Get statistics for a shortened URL"""
+    async def cache_get(self, shortcode: str):
+        """Read a cache entry; Redis outages fall through to the database"""
+        try:
+            return await self.cache.get(cache_key(shortcode))
+        except RedisError:
+            return None
+    
+    async def cache_set(self, shortcode: str, value: str, ttl: int, nx: bool = False):
+        """Write a cache entry (only if absent when nx); Redis outages are ignored"""
+        try:
+            await self.cache.set(cache_key(shortcode), value, ex=ttl, nx=nx)
+        except RedisError:
+            pass
+    
+    async def get_statistics(self, shortcode: str, limit: int = None, offset: int = 0) -> dict:
+        """Get statistics for a shortened URL, shaped like URLStatistics"""
         
-        url_mapping = self.db.query(URLMapping).filter(
-            URLMapping.shortcode == shortcode
-        ).first()
+        url_mapping = (await self.db.execute(
+            select(
+                URLMapping.original_url,
+                URLMapping.created_at,
+                URLMapping.expires_at,
+                URLMapping.click_count
+            ).where(URLMapping.shortcode == shortcode)
+        )).first()
         
         if not url_mapping:
             raise HTTPException(status_code=404, detail="Shortcode not found")
         
-        # Get click logs
-        click_logs = self.db.query(ClickLog).filter(
-            ClickLog.shortcode == shortcode
-        ).all()
-        
-        click_data = [
-            ClickData(
-                timestamp=log.clicked_at,
-                referrer=log.referrer,
-                user_agent=log.user_agent,
-                ip_address=log.ip_address,
-                location=log.location
-            ) for log in click_logs
-        ]
-        
-        return URLStatistics(
-            shortcode=shortcode,
-            original_url=url_mapping.original_url,
-            created_at=url_mapping.created_at,
-            expires_at=url_mapping.expires_at,
-            total_clicks=url_mapping.click_count,
-            click_data=click_data
+        # Plain dicts straight from the rows; the response encodes datetimes itself
+        click_rows = await self.db.execute(
+            select(
+                ClickLog.clicked_at.label('timestamp'),
+                ClickLog.referrer,
+                ClickLog.user_agent,
+                ClickLog.ip_address,
+                ClickLog.location
+            )
+            .where(ClickLog.shortcode == shortcode)
+            .order_by(ClickLog.clicked_at)
+            .limit(limit)
+            .offset(offset)
         )
+        
+        return {
+            'shortcode': shortcode,
+            'original_url': url_mapping.original_url,
+            'created_at': url_mapping.created_at,
+            'expires_at': url_mapping.expires_at,
+            'total_clicks': url_mapping.click_count,
+            'click_data': [dict(row) for row in click_rows.mappings()]
+        }
     
-    def shortcode_exists(self, shortcode: str) -> bool:
+    async def shortcode_exists(self, shortcode: str) -> bool:
         """Check if shortcode already exists"""
-        return self.db.query(URLMapping).filter(
-            URLMapping.shortcode == shortcode
-        ).first() is not None
+        return (await self.db.execute(
+            select(literal(1)).where(URLMapping.shortcode == shortcode).limit(1)
+        )).scalar() is not None
     
-    def generate_unique_shortcode(self) -> str:
-        """Generate a unique shortcode"""
-        max_attempts = 10
-        for _ in range(max_attempts):
-            shortcode = generate_shortcode()
-            if not self.shortcode_exists(shortcode):
-                return shortcode
-        
-        # If we can't generate a unique shortcode, try with longer length
-        for length in range(config.SHORTCODE_LENGTH + 1, config.SHORTCODE_LENGTH + 5):
-            shortcode = generate_shortcode(length)
-            if not self.shortcode_exists(shortcode):
-                return shortcode
+    async def generate_unique_shortcode(self) -> str:
+        """Generate a unique shortcode, probing a batch of candidates per query"""
+        # If a whole batch collides, retry with longer shortcodes
+        for length in range(config.SHORTCODE_LENGTH, config.SHORTCODE_LENGTH + 5):
+            candidates = [generate_shortcode(length) for _ in range(config.SHORTCODE_CANDIDATES)]
+            taken = set((await self.db.execute(
+                select(URLMapping.shortcode).where(URLMapping.shortcode.in_(candidates))
+            )).scalars())
+            for shortcode in candidates:
+                if shortcode not in taken:
+                    return shortcode
         
         raise HTTPException(status_code=500, detail="Unable to generate unique shortcode")
+
+async def flush_clicks(clicks: list):
+    """Write a batch of clicks: one bulk INSERT, one counter UPDATE, one commit"""
+    for click in clicks:
+        click['location'] = extract_location_from_ip(click['ip_address'])
+    counts = Counter(click['shortcode'] for click in clicks)
     
-    def log_click(self, shortcode: str, request_info: dict):
-        """Log a click event"""
-        
-        click_log = ClickLog(
-            shortcode=shortcode,
-            referrer=request_info.get('referrer'),
-            user_agent=request_info.get('user_agent'),
-            ip_address=request_info.get('ip_address'),
-            location=extract_location_from_ip(request_info.get('ip_address'))
-        )
-        
-        self.db.add(click_log)
-        self.db.commit()
\ No newline at end of file
+    async with SessionLocal() as db:
+        try:
+            await db.execute(insert(ClickLog), clicks)
+            # Atomic in-SQL increment, one executemany for every shortcode in the batch
+            url_mappings = URLMapping.__table__
+            await db.execute(
+                update(url_mappings)
+                .where(url_mappings.c.shortcode == bindparam('sc'))
+                .values(click_count=url_mappings.c.click_count + bindparam('n')),
+                [{'sc': shortcode, 'n': n} for shortcode, n in counts.items()]
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.exception("Click logging failed for %d clicks", len(clicks))
+
+def report_dropped_clicks():
+    """Log and reset the count of clicks dropped since the last report"""
+    global dropped_clicks
+    if dropped_clicks:
+        logger.warning("Click queue full, dropped %d clicks", dropped_clicks)
+        dropped_clicks = 0
+
+async def click_flusher(queue: asyncio.Queue):
+    """Drain the click queue, flushing every CLICK_FLUSH_BATCH clicks or CLICK_FLUSH_INTERVAL seconds"""
+    # Exits on STOP_FLUSHER rather than cancellation, so a batch is never cut off mid-write
+    loop = asyncio.get_running_loop()
+    while True:
+        click = await queue.get()
+        if click is STOP_FLUSHER:
+            return
+        batch = [click]
+        stopping = False
+        # One bad batch must not end the task and leave the queue to fill up
+        try:
+            deadline = loop.time() + config.CLICK_FLUSH_INTERVAL
+            while len(batch) < config.CLICK_FLUSH_BATCH:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    click = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if click is STOP_FLUSHER:
+                    stopping = True
+                    break
+                batch.append(click)
+            await flush_clicks(batch)
+            report_dropped_clicks()
+        except Exception:
+            logger.exception("Click flusher failed on a batch of %d clicks", len(batch))
+        if stopping:
+            return
+
+def start_click_flusher(queue: asyncio.Queue) -> asyncio.Task:
+    """Run click_flusher as a task that logs if it ever exits on its own"""
+    flusher = asyncio.create_task(click_flusher(queue))
+    flusher.add_done_callback(_log_flusher_exit)
+    return flusher
+
+def _log_flusher_exit(flusher: asyncio.Task):
+    if flusher.cancelled():
+        logger.error("Click flusher was cancelled; queued clicks will be dropped")
+    elif flusher.exception() is not None:
+        logger.error("Click flusher stopped unexpectedly", exc_info=flusher.exception())
+
+async def stop_click_flusher(queue: asyncio.Queue, flusher: asyncio.Task):
+    """Ask the flusher to write what is queued and exit, giving up after CLICK_SHUTDOWN_TIMEOUT"""
+    if flusher.done():
+        # Already exited (and logged why); account for what it left behind
+        report_dropped_clicks()
+        if not queue.empty():
+            logger.error("%d queued clicks were never written", queue.qsize())
+        return
+    try:
+        await asyncio.wait_for(queue.put(STOP_FLUSHER), config.CLICK_SHUTDOWN_TIMEOUT)
+        await asyncio.wait_for(flusher, config.CLICK_SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.error("Click flusher did not stop within %ss; %d clicks dropped",
+                     config.CLICK_SHUTDOWN_TIMEOUT, queue.qsize())
@@ -1,34 +1,102 @@
-import random
-import string
+import base64
+import logging
+import os
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from config import config
 
+try:
+    import geoip2.database
+    import geoip2.errors
+    from maxminddb import InvalidDatabaseError
+except ImportError:  # GeoIP is optional; locations fall back to a placeholder
+    geoip2 = None
+
+logger = logging.getLogger(__name__)
+
+_geoip_reader = None
+
 def generate_shortcode(length: int = None) -> str:
-    """Generate a random shortcode"""
+    """Generate a random URL-safe shortcode from the OS CSPRNG"""
     if length is None:
         length = config.SHORTCODE_LENGTH
     
-    return ''.join(random.choices(config.SHORTCODE_CHARS, k=length))
+    # Base64 yields 4 chars per 3 bytes, so `length` bytes is always enough
+    return base64.urlsafe_b64encode(os.urandom(length))[:length].decode()
+
+def utcnow() -> datetime:
+    """Current UTC time as a naive datetime; the DateTime columns store naive UTC"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 def calculate_expiry(validity_minutes: int = None) -> datetime:
     """Calculate expiry datetime"""
     if validity_minutes is None:
         validity_minutes = config.DEFAULT_VALIDITY_MINUTES
     
-    return datetime.now(timezone.utc) + timedelta(minutes=validity_minutes)
+    return utcnow() + timedelta(minutes=validity_minutes)
+
+def as_utc(dt: datetime) -> datetime:
+    """Attach UTC to naive datetimes (SQLite drops tzinfo on read)"""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+def to_epoch(dt: datetime) -> int:
+    """Convert a datetime to whole Unix seconds"""
+    return int(as_utc(dt).timestamp())
 
 def is_expired(expires_at: datetime) -> bool:
     """Check if a URL has expired"""
-    return datetime.now(timezone.utc) > expires_at
+    return datetime.now(timezone.utc) > as_utc(expires_at)
 
 def format_iso8601(dt: datetime) -> str:
-    """Format datetime to ISO 8601 string"""
-    return dt.isoformat().replace('+00:00', 'Z')
+    """Format a UTC datetime to ISO 8601 string"""
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def open_geoip_reader(path: str):
+    """Open the MaxMind database once, if geoip2 and a City database file are available"""
+    global _geoip_reader
+    if geoip2 is None or not path or not os.path.exists(path):
+        return _geoip_reader
+    try:
+        reader = geoip2.database.Reader(path)
+    except (InvalidDatabaseError, OSError, ValueError):
+        logger.exception("Cannot open GeoIP database %s; using placeholder locations", path)
+        return _geoip_reader
+    database_type = reader.metadata().database_type
+    if "City" not in database_type:
+        # Reader.city() raises TypeError on Country/ASN databases
+        logger.error("GeoIP database %s is %s, not a City database; using placeholder locations",
+                     path, database_type)
+        reader.close()
+        return _geoip_reader
+    _geoip_reader = reader
+    _lookup_location.cache_clear()
+    return _geoip_reader
+
+def close_geoip_reader():
+    global _geoip_reader
+    if _geoip_reader is not None:
+        _geoip_reader.close()
+        _geoip_reader = None
+        _lookup_location.cache_clear()
+
+@lru_cache(maxsize=100_000)
+def _lookup_location(ip_prefix: str) -> str:
+    try:
+        return _geoip_reader.city(ip_prefix).country.iso_code or "Unknown"
+    except (geoip2.errors.GeoIP2Error, InvalidDatabaseError, TypeError, ValueError):
+        # AddressNotFoundError is a GeoIP2Error; a bad lookup must never stop the click flusher
+        return "Unknown"
 
 def extract_location_from_ip(ip_address: str) -> str:
     """Extract coarse-grained geographical location from IP"""
-    # In a real implementation, you would use a GeoIP service
-    # For this example, we'll return a placeholder
-    if ip_address and ip_address != "127.0.0.1":
+    if not ip_address or ip_address == "127.0.0.1":
+        return "Local"
+    if _geoip_reader is None:
+        # Placeholder when no GeoIP database is configured
         return f"Location-{ip_address.split('.')[0]}"
-    return "Local"
\ No newline at end of file
+    # Neighbouring IPv4 addresses share a /24, so cache per prefix
+    if '.' in ip_address:
+        ip_address = '.'.join(ip_address.split('.')[:3]) + '.0'
+    return _lookup_location(ip_address)
\ No newline at end of file